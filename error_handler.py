@@ -1,6 +1,7 @@
 SUCCESS = 'Success'
 BAD_REQUEST = 'Bad Request'
 SERVER_ERROR = 'API Error'
+RATE_LIMITED = 'Too Many Requests - OCR rate limit or quota reached'
 USER_CREATED = 'User created successfully'
 USER_EXIST = 'Conflict - Username already exists'
 LOGIN_SUCCESS = 'Login successful'
@@ -1,73 +1,369 @@
 import os
+import sys
+import asyncio
+import aiohttp
 import cv2
 import requests
 import re
 import json
+import string
+import time
+import random
+import hmac
 import getpass
+import threading
+import mimetypes
 import error_handler
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 from dotenv import load_dotenv
-from pymongo import MongoClient
-import test_pytestcv
-
-# Load environment variable from .env file
+from requests.adapters import HTTPAdapter
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+from urllib3.util.retry import Retry
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+# Environment variables the module and its tests need; .env is only read if one of them is missing.
+# When they are all set, optional settings (OCR_RPS, DEBUG_SAVE_CAPTURE, SHOW_CAPTURE, CAPTURE_COUNT)
+# must be exported as well, since .env is not read at all.
+REQUIRED_ENV_VARS = ("API_KEY", "OCR_URL", "MONGO_URI", "DATABASE", "TEST_DATABASE")
+
+# Load environment variable from .env file, unless the environment is already configured
 current_path = os.path.dirname(__file__)
 dotenv_filename = os.path.join(current_path, ".env")
-load_dotenv(dotenv_path=dotenv_filename)
+if not all(os.getenv(name) for name in REQUIRED_ENV_VARS):
+    # Variables that are already set still take precedence over .env
+    load_dotenv(dotenv_path=dotenv_filename)
 ocr_space_api_key = os.getenv("API_KEY")
 ocr_url = os.getenv("OCR_URL")
 MONGO_URI = os.getenv("MONGO_URI")
 USER_DATABASE_PATH = os.getenv("DATABASE")
+# Also write each capture to captured_image.jpg when set, for debugging
+DEBUG_SAVE_CAPTURE = os.getenv("DEBUG_SAVE_CAPTURE", "").lower() in ("1", "true", "yes")
+# Show each capture in a preview window when set
+SHOW_CAPTURE = os.getenv("SHOW_CAPTURE", "").lower() in ("1", "true", "yes")
+# Number of images captured per run
+CAPTURE_COUNT = int(os.getenv("CAPTURE_COUNT", "1"))
+# Frames discarded before each capture to flush the camera driver's buffer (V4L2 typically keeps ~4)
+CAMERA_STALE_FRAMES = 4
+
+# MongoDB connection pool size shared by concurrent callers
+MONGO_MAX_POOL_SIZE = 32
+# Argon2 hasher for stored passwords
+password_hasher = PasswordHasher()
+# Retry policy for transient OCR.space failures (429 / 5xx)
+OCR_MAX_ATTEMPTS = 3
+OCR_BACKOFF_BASE = 0.5
+OCR_BACKOFF_MAX_WAIT = 8
+# Body substrings OCR.space uses to report rate limiting
+RATE_LIMIT_MARKERS = ("rate limit", "quota")
+# Maximum OCR requests per second sent from this process (0 or less disables rate limiting)
+OCR_REQUESTS_PER_SECOND = float(os.getenv("OCR_RPS", "2"))
+
+# 5xx statuses worth retrying
+RETRY_STATUS_CODES = [500, 502, 503, 504]
+
+# Keep-alive connection pool sizes for the OCR HTTP session
+HTTP_POOL_CONNECTIONS = 16
+HTTP_POOL_MAXSIZE = 32
+
+# Persistent HTTP session so TCP/TLS connections are reused across OCR calls. It retries 5xx and
+# connection errors with exponential backoff, for OCR_MAX_ATTEMPTS POSTs in total. 429 is
+# deliberately left out: it is retried only by upload_and_extract_content, so rate-limited
+# requests are not retried by both layers and stay paced by ocr_rate_limiter. The adapter's own
+# 5xx retries are not paced by ocr_rate_limiter. Retry-After is ignored so its backoff stays bounded.
+SESSION = requests.Session()
+_retry_adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                             max_retries=Retry(total=OCR_MAX_ATTEMPTS - 1, backoff_factor=OCR_BACKOFF_BASE,
+                                               status_forcelist=RETRY_STATUS_CODES,
+                                               allowed_methods=["POST"], raise_on_status=False,
+                                               respect_retry_after_header=False))
+SESSION.mount("https://", _retry_adapter)
+SESSION.mount("http://", _retry_adapter)
+
+# Session for streamed file uploads. A streamed body cannot be replayed, so this adapter only
+# retries failed connections; 5xx responses and rate limits are retried by reopening the file
+# in upload_and_extract_content
+STREAM_SESSION = requests.Session()
+_stream_adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                              max_retries=Retry(total=OCR_MAX_ATTEMPTS - 1, read=False,
+                                                backoff_factor=OCR_BACKOFF_BASE, allowed_methods=["POST"]))
+STREAM_SESSION.mount("https://", _stream_adapter)
+STREAM_SESSION.mount("http://", _stream_adapter)
+
+# Maximum number of OCR requests in flight at once in the async pipeline
+OCR_CONCURRENCY = 8
+# Default number of worker threads used by batch_extract
+OCR_MAX_WORKERS = 8
+# Longest side and JPEG quality of captured frames sent for OCR
+OCR_MAX_DIM = 1600
+OCR_JPEG_QUALITY = 80
+# Number of queued extracted-content updates sent to MongoDB in one bulk_write
+BULK_WRITE_BATCH_SIZE = 500
+
+# Pattern identifying words (group 1) and integers (group 2) in extracted content in a single pass
+_TOKEN_RE = re.compile(r'\b(?:([A-Za-z]+)|(\d+))\b')
+# Translation table turning every ASCII non-word character into a space, for fast_tokenize
+_SEP_TABLE = str.maketrans({char: ' ' for char in map(chr, range(128))
+                            if char not in string.ascii_letters + string.digits + '_'})
+# Translation table stripping line breaks from extracted content
+_NL_TABLE = str.maketrans('', '', '\r\n')
+
+
+@lru_cache(maxsize=1)
+def _mongo_client():
+    """
+    Connects to MongoDB on first use.
+
+    Returns:
+        pymongo.MongoClient: Shared MongoDB client.
+    """
+    return MongoClient(MONGO_URI, maxPoolSize=MONGO_MAX_POOL_SIZE)
+
+
+@lru_cache(maxsize=1)
+def _user_collection():
+    """
+    Returns the users collection, creating its indexes on first use.
 
-# MongoDB setup
-client = MongoClient(MONGO_URI)
-db = client[USER_DATABASE_PATH]
-user_collection = db["users"]
+    Returns:
+        pymongo.collection.Collection: Users collection.
+    """
+    user_collection = _mongo_client()[USER_DATABASE_PATH]["users"]
+    # Unique index backing username lookups and enforcing one account per username
+    user_collection.create_index("username", unique=True)
+    return user_collection
+
+
+class RateLimited(Exception):
+    """
+    Raised when OCR.space reports that the request rate limit or quota has been reached.
+    """
 
 
-def upload_and_extract_content(image_url=None, local_file_path=None, api_key=None, language='eng'):
+class StreamUploadFailed(Exception):
     """
-    Uploads an image (either from a URL or a local file), performs OCR, and extracts content.
+    Raised when a streamed file upload gets a 5xx response, which the HTTP adapter cannot replay.
+    """
+
+
+class TokenBucket:
+    """
+    Process-local rate limiter keeping consecutive calls at least 1/rps seconds apart.
+
+    Thread-safe, so it can be shared by batch_extract workers and the async pipeline.
+    A rate of 0 or less means unlimited.
+    """
+
+    def __init__(self, rps):
+        self.min_interval = 1.0 / rps if rps > 0 else 0.0
+        self.last_call = float('-inf')
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """
+        Reserves the next call slot.
+
+        Returns:
+            float: Seconds to wait before the reserved slot is reached.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.last_call = max(now, self.last_call + self.min_interval)
+            return self.last_call - now
+
+    def acquire(self):
+        """
+        Blocks until the next call is allowed.
+        """
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """
+        Waits, without blocking the event loop, until the next call is allowed.
+        """
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+# Shared limiter pacing every request sent to OCR.space
+ocr_rate_limiter = TokenBucket(OCR_REQUESTS_PER_SECOND)
+
+
+def upload_and_extract_content(image_url=None, local_file_path=None, api_key=None, language='eng', file_bytes=None):
+    """
+    Uploads an image (either from a URL, a local file or in-memory bytes), performs OCR, and extracts content.
 
     Args:
         image_url (str): URL of the image to be processed.
         local_file_path (str): Local file path of the image to be processed.
         api_key (str): API key.
         language (str): OCR language (default is 'eng' for English).
+        file_bytes (bytes): Encoded JPEG image to be processed, used before local_file_path.
 
     Returns:
         str: Extracted text content from the image.
 
     Raises:
-        ValueError: If API key is not provided or if neither image URL nor local file path is provided.
+        ValueError: If API key is not provided or if none of image URL, local file path or file bytes is provided.
     """
     # error handling for api
     if not api_key:
         raise ValueError("API key is required")
     # error handling for image
-    if not image_url and not local_file_path:
-        raise ValueError("Either image URL or local file path must be provided")
+    if not image_url and not local_file_path and not file_bytes:
+        raise ValueError("Either image URL, local file path or file bytes must be provided")
+
+    for attempt in range(OCR_MAX_ATTEMPTS):
+        try:
+            return _request_ocr(image_url, local_file_path, api_key, language, file_bytes)
+        except (RateLimited, StreamUploadFailed) as e:
+            if attempt == OCR_MAX_ATTEMPTS - 1:
+                print(f"Error: {e}")
+                return None
+            time.sleep(_backoff_wait(attempt))
+
+
+def _backoff_wait(attempt):
+    """
+    Computes how long to wait before retrying a rate-limited or failed OCR request.
+
+    Args:
+        attempt (int): Zero-based number of the attempt that failed.
+
+    Returns:
+        float: Seconds to wait, growing exponentially with jitter up to OCR_BACKOFF_MAX_WAIT.
+    """
+    wait = min(OCR_BACKOFF_MAX_WAIT, OCR_BACKOFF_BASE * 2 ** attempt)
+    return wait + random.uniform(0, OCR_BACKOFF_BASE)
 
-    if local_file_path:
+
+def _request_ocr(image_url, local_file_path, api_key, language, file_bytes=None):
+    """
+    Sends a single OCR request and extracts content from the response.
+
+    Args:
+        image_url (str): URL of the image to be processed.
+        local_file_path (str): Local file path of the image to be processed.
+        api_key (str): API key.
+        language (str): OCR language.
+        file_bytes (bytes): Encoded JPEG image to be processed.
+
+    Returns:
+        str or None: Extracted text content from the image, or None if the request failed.
+
+    Raises:
+        RateLimited: If OCR.space reports that the rate limit or quota has been reached.
+        StreamUploadFailed: If a streamed file upload gets a 5xx response.
+    """
+    ocr_rate_limiter.acquire()
+    if file_bytes:
+        files = {'file': ('capture.jpg', file_bytes, 'image/jpeg')}
+        response = SESSION.post(ocr_url, files=files,
+                                data={'apikey': api_key, 'language': language})
+    elif local_file_path:
+        content_type = mimetypes.guess_type(local_file_path)[0] or 'application/octet-stream'
         with open(local_file_path, 'rb') as file:
-            files = {'file': file}
-            response = requests.post(ocr_url, files=files,
-                                     data={'apikey': api_key, 'language': language})
+            # Stream the multipart body straight from disk instead of buffering it in memory
+            encoder = MultipartEncoder(fields={
+                'file': (os.path.basename(local_file_path), file, content_type),
+                'apikey': api_key,
+                'language': language,
+            })
+            response = STREAM_SESSION.post(ocr_url, data=encoder,
+                                           headers={'Content-Type': encoder.content_type})
+        if response.status_code in RETRY_STATUS_CODES:
+            raise StreamUploadFailed(error_handler.SERVER_ERROR)
     else:
         payload = {
             'url': image_url,
             'apikey': api_key,
             'language': language,
         }
-        response = requests.post(ocr_url, data=payload)
+        response = SESSION.post(ocr_url, data=payload)
+
+    if not _check_ocr_status(response.status_code):
+        return None
+    return _read_ocr_result(response.json())
+
 
-    if response.status_code == 200:
+def _check_ocr_status(status_code):
+    """
+    Classifies the HTTP status of an OCR.space response.
+
+    Args:
+        status_code (int): HTTP status code.
+
+    Returns:
+        bool: True if the response body should be parsed, False if the request failed.
+
+    Raises:
+        RateLimited: If the status is 429 Too Many Requests.
+    """
+    if status_code == 200:
         error_handler.SUCCESS
-    elif response.status_code == 400:
+    elif status_code == 400:
         error_handler.BAD_REQUEST
+    elif status_code == 429:
+        raise RateLimited(error_handler.RATE_LIMITED)
     else:
         error_handler.SERVER_ERROR
-        return None
-    result = response.json()
+        return False
+    return True
+
+
+def _read_ocr_result(result):
+    """
+    Extracts the parsed text from an OCR.space JSON response, checking for rate limit errors first.
+
+    Args:
+        result (dict): Decoded JSON response.
+
+    Returns:
+        str or None: Extracted text content, or None if the response structure is invalid.
+
+    Raises:
+        RateLimited: If OCR.space reports that the rate limit or quota has been reached.
+    """
+    if _is_rate_limited(result):
+        raise RateLimited(error_handler.RATE_LIMITED)
+    return _parse_ocr_result(result)
+
+
+def _is_rate_limited(result):
+    """
+    Checks whether an OCR.space JSON response reports a rate limit or quota error.
+
+    Args:
+        result (dict): Decoded JSON response.
+
+    Returns:
+        bool: True if the error message mentions a rate limit or quota.
+    """
+    message = result.get('ErrorMessage') if isinstance(result, dict) else None
+    if not message:
+        return False
+    if isinstance(message, list):
+        message = ' '.join(str(part) for part in message)
+    message = str(message).lower()
+    return any(marker in message for marker in RATE_LIMIT_MARKERS)
+
+
+def _parse_ocr_result(result):
+    """
+    Extracts the parsed text from an OCR.space JSON response.
+
+    Args:
+        result (dict): Decoded JSON response.
+
+    Returns:
+        str or None: Extracted text content, or None if the response structure is invalid.
+    """
     # Check if the response is valid.
     if 'ParsedResults' not in result or not result['ParsedResults']:
         print('Invalid response structure:', result)
@@ -76,6 +372,304 @@ def upload_and_extract_content(image_url=None, local_file_path=None, api_key=Non
     return text
 
 
+async def ocr_one(session, sem, path_or_url, api_key, language='eng'):
+    """
+    Performs OCR on a single image (either a URL or a local file) without blocking the event loop.
+
+    Args:
+        session (aiohttp.ClientSession): Session used to send the request.
+        sem (asyncio.Semaphore): Semaphore bounding the number of requests in flight.
+        path_or_url (str): URL or local file path of the image to be processed.
+        api_key (str): API key.
+        language (str): OCR language (default is 'eng' for English).
+
+    Returns:
+        str or None: Extracted text content from the image, or None if the request failed.
+    """
+    async with sem:
+        for attempt in range(OCR_MAX_ATTEMPTS):
+            try:
+                return await _request_ocr_async(session, path_or_url, api_key, language)
+            except RateLimited as e:
+                if attempt == OCR_MAX_ATTEMPTS - 1:
+                    print(f"Error: {e}")
+                    return None
+                await asyncio.sleep(_backoff_wait(attempt))
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError, json.JSONDecodeError) as e:
+                # A failed image must not abort the rest of the batch
+                print(f"Error: {e}")
+                return None
+
+
+async def _request_ocr_async(session, path_or_url, api_key, language):
+    """
+    Sends a single OCR request without blocking the event loop and extracts content from the response.
+
+    Args:
+        session (aiohttp.ClientSession): Session used to send the request.
+        path_or_url (str): URL or local file path of the image to be processed.
+        api_key (str): API key.
+        language (str): OCR language.
+
+    Returns:
+        str or None: Extracted text content from the image, or None if the request failed.
+
+    Raises:
+        RateLimited: If OCR.space reports that the rate limit or quota has been reached.
+    """
+    await ocr_rate_limiter.acquire_async()
+    if path_or_url.startswith(('http://', 'https://')):
+        payload = {
+            'url': path_or_url,
+            'apikey': api_key,
+            'language': language,
+        }
+        async with session.post(ocr_url, data=payload) as response:
+            if not _check_ocr_status(response.status):
+                return None
+            result = await response.json(content_type=None)
+    else:
+        with open(path_or_url, 'rb') as file:
+            form = aiohttp.FormData()
+            form.add_field('file', file, filename=os.path.basename(path_or_url))
+            form.add_field('apikey', api_key)
+            form.add_field('language', language)
+            async with session.post(ocr_url, data=form) as response:
+                if not _check_ocr_status(response.status):
+                    return None
+                result = await response.json(content_type=None)
+    return _read_ocr_result(result)
+
+
+async def upload_and_extract_content_async(paths_or_urls, api_key=None, language='eng', concurrency=OCR_CONCURRENCY):
+    """
+    Performs OCR on several images concurrently, with at most `concurrency` requests in flight.
+
+    Args:
+        paths_or_urls (list): URLs or local file paths of the images to be processed.
+        api_key (str): API key.
+        language (str): OCR language (default is 'eng' for English).
+        concurrency (int): Maximum number of concurrent OCR requests.
+
+    Returns:
+        list: Extracted text content for each image, in input order (None for failed images).
+
+    Raises:
+        ValueError: If API key is not provided.
+    """
+    if not api_key:
+        raise ValueError("API key is required")
+    sem = asyncio.Semaphore(concurrency)
+    async with aiohttp.ClientSession() as session:
+        return await asyncio.gather(*(ocr_one(session, sem, item, api_key, language) for item in paths_or_urls))
+
+
+def extract_contents(paths_or_urls, api_key=None, language='eng', concurrency=OCR_CONCURRENCY):
+    """
+    Synchronous entry point for the async OCR pipeline.
+
+    Args:
+        paths_or_urls (list): URLs or local file paths of the images to be processed.
+        api_key (str): API key.
+        language (str): OCR language (default is 'eng' for English).
+        concurrency (int): Maximum number of concurrent OCR requests.
+
+    Returns:
+        list: Extracted text content for each image, in input order (None for failed images).
+    """
+    return asyncio.run(upload_and_extract_content_async(paths_or_urls, api_key, language, concurrency))
+
+
+def batch_extract(paths, api_key=None, max_workers=OCR_MAX_WORKERS, language='eng'):
+    """
+    Performs OCR on several local files in parallel using a bounded pool of worker threads.
+
+    Args:
+        paths (list): Local file paths of the images to be processed.
+        api_key (str): API key.
+        max_workers (int): Maximum number of worker threads.
+        language (str): OCR language (default is 'eng' for English).
+
+    Returns:
+        list: Extracted text content for each image, in input order (None for failed images).
+
+    Raises:
+        ValueError: If API key is not provided.
+    """
+    if not api_key:
+        raise ValueError("API key is required")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda path: _extract_one(path, api_key, language), paths))
+
+
+def _extract_one(path, api_key, language):
+    """
+    Performs OCR on a single local file for batch_extract, turning a failure into None.
+
+    Args:
+        path (str): Local file path of the image to be processed.
+        api_key (str): API key.
+        language (str): OCR language.
+
+    Returns:
+        str or None: Extracted text content from the image, or None if the request failed.
+    """
+    try:
+        return upload_and_extract_content(local_file_path=path, api_key=api_key, language=language)
+    except (requests.RequestException, OSError, ValueError) as e:
+        # A failed image must not abort the rest of the batch
+        print(f"Error: {e}")
+        return None
+
+
+def extract_words_and_integers(text):
+    """
+    Identifies the words and integers in extracted content with a single scan of the text.
+
+    Args:
+        text (str): Extracted text content.
+
+    Returns:
+        tuple: List of words and list of integers (as strings), in order of appearance.
+    """
+    words = []
+    integers = []
+    for match in _TOKEN_RE.finditer(text):
+        (words if match.lastindex == 1 else integers).append(match.group(match.lastindex))
+    return words, integers
+
+
+def fast_tokenize(text):
+    """
+    Identifies the words and integers in extracted content using only C-level str methods.
+
+    Gives the same result as extract_words_and_integers. Non-ASCII text falls back to the regex path,
+    since Unicode word boundaries cannot be expressed with a translation table.
+
+    Args:
+        text (str): Extracted text content.
+
+    Returns:
+        tuple: List of words and list of integers (as strings), in order of appearance.
+    """
+    if not text.isascii():
+        return extract_words_and_integers(text)
+    words = []
+    integers = []
+    # Every remaining token is a maximal run of word characters, i.e. bounded by \b on both sides
+    for token in text.translate(_SEP_TABLE).split():
+        if token.isalpha():
+            words.append(token)
+        elif token.isdigit():
+            integers.append(token)
+    return words, integers
+
+
+def queue_extracted_content(ops, username, extracted_array_content):
+    """
+    Queues an extracted-content update for a user and flushes the queue once it is full.
+
+    Args:
+        ops (list): Pending UpdateOne operations.
+        username (str): Username whose document receives the extracted content.
+        extracted_array_content (dict): Extracted content entry to push.
+    """
+    ops.append(UpdateOne({"username": username}, {"$push": {"extracted_content": extracted_array_content}}))
+    if len(ops) >= BULK_WRITE_BATCH_SIZE:
+        flush(ops)
+
+
+def flush(ops):
+    """
+    Sends the queued update operations to MongoDB in a single bulk_write and clears the queue.
+
+    Args:
+        ops (list): Pending UpdateOne operations.
+
+    Returns:
+        pymongo.results.BulkWriteResult or None: Result of the bulk write, or None if nothing was queued.
+    """
+    if not ops:
+        return None
+    result = _user_collection().bulk_write(ops, ordered=False)
+    ops.clear()
+    return result
+
+
+def _camera_backend():
+    """
+    Picks the native OpenCV capture backend for this platform, so OpenCV skips backend probing.
+
+    Returns:
+        int: OpenCV VideoCapture API preference.
+    """
+    if sys.platform == 'win32':
+        return cv2.CAP_DSHOW
+    if sys.platform == 'darwin':
+        return cv2.CAP_AVFOUNDATION
+    return cv2.CAP_V4L2
+
+
+class Camera:
+    """
+    Context manager holding the webcam or connected camera device open across several captures.
+
+    Args:
+        index (int): Camera device index.
+        backend (int): OpenCV capture backend (default is the platform's native backend).
+
+    Raises:
+        RuntimeError: If the camera cannot be opened or if a frame cannot be read.
+    """
+
+    def __init__(self, index=0, backend=None):
+        self.index = index
+        self.backend = _camera_backend() if backend is None else backend
+        self.cap = None
+        self._drain = False
+        self._captured = False
+
+    def __enter__(self):
+        self.cap = cv2.VideoCapture(self.index, self.backend)
+        if not self.cap.isOpened():
+            # The preferred backend may be missing from this OpenCV build; let OpenCV pick one
+            self.cap.release()
+            self.cap = cv2.VideoCapture(self.index, cv2.CAP_ANY)
+            if not self.cap.isOpened():
+                self.cap.release()
+                raise RuntimeError("Could not open camera.")
+        # Keep as few queued frames as the backend allows; unsupported backends ignore this
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self._drain = self.cap.get(cv2.CAP_PROP_BUFFERSIZE) != 1
+        self._captured = False
+        return self
+
+    def capture(self):
+        """
+        Captures a frame from the open camera.
+
+        Returns:
+            numpy.ndarray: Captured image as a NumPy array.
+        """
+        # The device stays open while the caller blocks on preview, OCR and rate limiting, so a
+        # driver that ignored the buffer size fills up with frames that can be long out of date.
+        # Drop them first so the returned frame shows the current scene; the first capture after
+        # opening is already fresh.
+        if self._drain and self._captured:
+            for _ in range(CAMERA_STALE_FRAMES):
+                self.cap.grab()
+        if not self.cap.grab():
+            raise RuntimeError("Could not read frame.")
+        ret, frame = self.cap.retrieve()
+        if not ret:
+            raise RuntimeError("Could not read frame.")
+        self._captured = True
+        return frame
+
+    def __exit__(self, *exc_info):
+        self.cap.release()
+
+
 def capture_image():
     """
     Captures an image from the webcam or connected camera device.
@@ -87,19 +681,35 @@ def capture_image():
         RuntimeError: If the camera cannot be opened or if a frame cannot be read.
     """
     try:
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened():
-            raise RuntimeError("Could not open camera.")
-        ret, frame = cap.read()
-        if not ret:
-            raise RuntimeError("Could not read frame.")
-        cap.release()
-        return frame
+        with Camera() as camera:
+            return camera.capture()
     except Exception as e:
         print(f"Error: {e}")
         return None
 
 
+def _prep_for_ocr(img, max_dim=OCR_MAX_DIM, quality=OCR_JPEG_QUALITY):
+    """
+    Downscales an image so its longest side is at most max_dim and encodes it as JPEG for upload.
+
+    Args:
+        img (numpy.ndarray): Image to be prepared.
+        max_dim (int): Maximum length of the longest side in pixels.
+        quality (int): JPEG quality (0-100).
+
+    Returns:
+        bytes or None: Encoded JPEG image, or None if encoding failed.
+    """
+    height, width = img.shape[:2]
+    scale = max_dim / max(height, width)
+    if scale < 1:
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    encoded, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not encoded:
+        return None
+    return buffer.tobytes()
+
+
 def create_user(user_input=None, password_input=None):
     """
     Creates a new user and adds their credentials to the database.
@@ -114,22 +724,18 @@ def create_user(user_input=None, password_input=None):
     Raises:
         RuntimeError: If the specified username already exists in the user database.
     """
+    username = user_input or input("Enter your username: ")
+    password = password_input or getpass.getpass("Enter your password: ")
+    # Add the new user to the MongoDB collection in a single round-trip; the unique
+    # index on username rejects existing usernames atomically
+    user_data = {"username": username, "pwhash": password_hasher.hash(password)}
     try:
-        username = user_input or input("Enter your username: ")
-        password = password_input or getpass.getpass("Enter your password: ")
-        # Load existing user data from the database
-        # Check if the username already exists in MongoDB
-        if user_collection.find_one({"username": username}):
-            raise RuntimeError("User already exists.")
-
-        # Add the new user to the MongoDB collection
-        user_data = {"username": username, "password": password}
-        user_collection.insert_one(user_data)
-        print("User created successfully.")
-        return username, password
-    except Exception as e:
+        _user_collection().insert_one(user_data)
+    except DuplicateKeyError as e:
         print(f"Error: {e}")
         raise RuntimeError("User already exists.")
+    print("User created successfully.")
+    return username, password
 
 
 def login(user_input=None, password_input=None, input_function=input):
@@ -137,7 +743,7 @@ def login(user_input=None, password_input=None, input_function=input):
     Logs in an existing user by verifying their credentials against the database.
 
     Args:
-        input_function: For testing
+        input_function: Function used to prompt for the username (replaceable for testing).
         user_input (str): Username provided by the user.
         password_input (str): Password provided by the user.
 
@@ -149,23 +755,75 @@ def login(user_input=None, password_input=None, input_function=input):
         RuntimeError: If the provided username and password do not match any existing user.
     """
     while True:
-        if test_pytestcv.test_login:
-            username = user_input or input_function
-        username = user_input or input("Enter your username: ")
+        username = user_input or input_function("Enter your username: ")
         password = password_input or getpass.getpass("Enter your password: ")
 
         # Check if the entered username and password are correct
-        user_data = user_collection.find_one({"username": username, "password": password})
-        if user_data:
+        user_data = _user_collection().find_one({"username": username}, {"pwhash": 1, "password": 1})
+        if user_data and _authenticate(user_data, password):
             print("Login successful.")
             return username
         else:
             print("Unauthorized. Please check your username and password.")
 
 
+def _authenticate(user_data, password):
+    """
+    Checks a password against a user document, upgrading the stored credentials when needed.
+
+    Accounts created before passwords were hashed store a plaintext "password" field. When such a
+    password matches, it is replaced by an Argon2 hash so the account keeps working. Hashes made
+    with outdated Argon2 parameters are also rehashed on a successful login.
+
+    Args:
+        user_data (dict): User document with its _id, pwhash and/or legacy password.
+        password (str): Password provided by the user.
+
+    Returns:
+        bool: True if the password is correct.
+    """
+    pwhash = user_data.get("pwhash")
+    if pwhash:
+        if not _verify_password(pwhash, password):
+            return False
+        if password_hasher.check_needs_rehash(pwhash):
+            _user_collection().update_one({"_id": user_data["_id"]},
+                                          {"$set": {"pwhash": password_hasher.hash(password)}})
+        return True
+
+    legacy_password = user_data.get("password")
+    if legacy_password is None or not hmac.compare_digest(str(legacy_password).encode(), password.encode()):
+        return False
+    _user_collection().update_one({"_id": user_data["_id"]},
+                                  {"$set": {"pwhash": password_hasher.hash(password)}, "$unset": {"password": ""}})
+    return True
+
+
+def _verify_password(pwhash, password):
+    """
+    Verifies a password against a stored Argon2 hash.
+
+    Args:
+        pwhash (str): Stored password hash.
+        password (str): Password provided by the user.
+
+    Returns:
+        bool: True if the password matches the hash.
+    """
+    if not pwhash:
+        return False
+    try:
+        return password_hasher.verify(pwhash, password)
+    except (VerificationError, InvalidHashError):
+        # Covers a wrong password as well as a corrupt or unsupported stored hash
+        return False
+
+
 if __name__ == '__main__':
     # Ask the user to log in or create a new account
     user_choice = input("Do you want to (L)ogin or (C)reate a new account? ").upper()
+    # Extracted-content updates waiting to be written to MongoDB
+    pending_ops = []
 
     try:
         if user_choice == 'L':
@@ -176,42 +834,50 @@ if __name__ == '__main__':
             print("Invalid choice. Exiting.")
             exit()
 
-        user_data = {user["username"]: {"password": user["password"]} for user in user_collection.find()}
-
-        # Capture an image from the webcam
-        captured_image = capture_image()
-
-        if captured_image is not None:
-            # Display the captured image
-            cv2.imshow('Captured Image', captured_image)
-            cv2.waitKey(0)
-            cv2.destroyAllWindows()
-
-            # Save the captured image to a file
-            cv2.imwrite('captured_image.jpg', captured_image)
-
-            # Extract content from the captured image
-            extracted_content = upload_and_extract_content(local_file_path='captured_image.jpg',
-                                                           api_key=ocr_space_api_key)
-
-            if extracted_content is not None:
-                cleaned_content = extracted_content.replace('\n', '').replace('\r', '')
-                extracted_array_content = {"text": cleaned_content}
-                user_collection.update_one({"username": username}, {"$push": {"extracted_content": extracted_array_content}})
-                # Identify words and integers using regular expressions
-                words = re.findall(r'\b[A-Za-z]+\b', extracted_content)
-                integers = re.findall(r'\b\d+\b', extracted_content)
-
-                # Display and print the identified words and integers
-                print('Extracted Content: ', extracted_content)
-                print('Extracted Words:', words)
-                print('Extracted Integers:', integers)
-            else:
-                print('Failed to extract content.')
-
-        else:
-            print('Failed to capture an image.')
+        # Capture images from the webcam, keeping the device open between captures
+        with Camera() as camera:
+            for _ in range(CAPTURE_COUNT):
+                try:
+                    captured_image = camera.capture()
+                except RuntimeError as e:
+                    print(f"Error: {e}")
+                    print('Failed to capture an image.')
+                    continue
+
+                if SHOW_CAPTURE:
+                    # Display the captured image
+                    cv2.imshow('Captured Image', captured_image)
+                    cv2.waitKey(0)
+                    cv2.destroyAllWindows()
+
+                if DEBUG_SAVE_CAPTURE:
+                    # Save the captured image to a file
+                    cv2.imwrite('captured_image.jpg', captured_image)
+
+                # Downscale and encode the captured image in memory and extract content from it
+                image_bytes = _prep_for_ocr(captured_image)
+                extracted_content = None
+                if image_bytes is not None:
+                    extracted_content = upload_and_extract_content(file_bytes=image_bytes,
+                                                                   api_key=ocr_space_api_key)
+
+                if extracted_content is not None:
+                    cleaned_content = extracted_content.translate(_NL_TABLE)
+                    extracted_array_content = {"text": cleaned_content}
+                    queue_extracted_content(pending_ops, username, extracted_array_content)
+                    # Identify words and integers
+                    words, integers = fast_tokenize(extracted_content)
+
+                    # Display and print the identified words and integers
+                    print('Extracted Content: ', extracted_content)
+                    print('Extracted Words:', words)
+                    print('Extracted Integers:', integers)
+                else:
+                    print('Failed to extract content.')
 
     except Exception as e:
         print(f"Error: {e}")
         exit()
+    finally:
+        # Write any remaining queued updates before shutting down
+        flush(pending_ops)
@@ -1,24 +1,60 @@
 import pytest
 import requests_mock
+import aiohttp
+from aioresponses import aioresponses
 import os
 import json
 import cv2
 import getpass
-from unittest.mock import patch, mock_open
+from unittest.mock import patch, mock_open, AsyncMock, MagicMock
 import numpy as np
-from opencv_with_users import upload_and_extract_content, capture_image, create_user, login, user_collection, client
+from opencv_with_users import upload_and_extract_content, capture_image, create_user, login, _user_collection, _mongo_client, \
+    queue_extracted_content, flush, extract_contents, extract_words_and_integers, password_hasher, batch_extract, \
+    _prep_for_ocr, TokenBucket, Camera, fast_tokenize
 
 TEST_OCR_API_KEY = os.getenv("API_KEY")
 TEST_DATABASE_PATH = os.getenv("TEST_DATABASE")
 
-# Create a test MongoDB client and set up the test database
-test_client = client
-test_db = test_client[TEST_DATABASE_PATH]
-test_user_collection = test_db["test"]
+@pytest.fixture(scope="module")
+def client():
+    """
+    Fixture connecting to MongoDB on first use and closing the client after the tests run.
+    """
+    mongo_client = _mongo_client()
+    yield mongo_client
+    mongo_client.close()
+    _user_collection.cache_clear()
+    _mongo_client.cache_clear()
+
+
+@pytest.fixture(scope="module")
+def user_collection(client):
+    """
+    Fixture providing the users collection.
+    """
+    return _user_collection()
+
+
+@pytest.fixture(scope="module")
+def test_user_collection(client):
+    """
+    Fixture providing the collection in the test database.
+    """
+    return client[TEST_DATABASE_PATH]["test"]
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit():
+    """
+    Fixture disabling the shared OCR rate limiter so mocked requests don't wait on each other.
+    """
+    with patch('opencv_with_users.ocr_rate_limiter.acquire'), \
+            patch('opencv_with_users.ocr_rate_limiter.acquire_async', new=AsyncMock()):
+        yield
 
 
 @pytest.fixture
-def setup_database():
+def setup_database(test_user_collection, user_collection):
     """
     Fixture to set up the test database before the test and clean it up afterward.
     """
@@ -91,6 +127,123 @@ def test_upload_and_extract_content_with_local_file(tmp_path):
         assert extracted_content == 'Test content'
 
 
+# Test case for the async pipeline with several image URLs
+def test_extract_contents_with_urls():
+    """
+    Test case for extracting content from several image URLs concurrently using MOCK.
+    """
+    image_urls = ['https://example.com/sample_image.jpg', 'https://example.com/sample_image1.jpg']
+    with aioresponses() as m:
+        mock_response = {'ParsedResults': [{'ParsedText': 'Test content'}]}
+        m.post('https://api.ocr.space/parse/image', payload=mock_response, repeat=True)
+
+        extracted_contents = extract_contents(image_urls, api_key=TEST_OCR_API_KEY)
+        assert extracted_contents == ['Test content', 'Test content']
+
+
+# Test case for the async pipeline retrying after a rate limit error
+def test_extract_contents_rate_limited_then_success():
+    """
+    Test case for the async pipeline backing off when OCR.space reports a rate limit.
+    """
+    image_url = 'https://example.com/sample_image.jpg'
+    with aioresponses() as m, patch('opencv_with_users._backoff_wait', return_value=0) as mock_backoff:
+        m.post('https://api.ocr.space/parse/image', payload={'ErrorMessage': ['Rate limit exceeded.']})
+        m.post('https://api.ocr.space/parse/image', status=429)
+        m.post('https://api.ocr.space/parse/image', payload={'ParsedResults': [{'ParsedText': 'Test content'}]})
+
+        extracted_contents = extract_contents([image_url], api_key=TEST_OCR_API_KEY)
+        assert extracted_contents == ['Test content']
+        assert mock_backoff.call_count == 2
+
+
+# Test case for the async pipeline with transport errors
+def test_extract_contents_transport_error():
+    """
+    Test case for the async pipeline returning None for images whose request fails, without aborting the batch.
+    """
+    image_urls = ['https://example.com/sample_image.jpg', 'https://example.com/sample_image1.jpg']
+    with aioresponses() as m:
+        m.post('https://api.ocr.space/parse/image', exception=aiohttp.ClientConnectionError(), repeat=True)
+
+        extracted_contents = extract_contents(image_urls, api_key=TEST_OCR_API_KEY)
+        assert extracted_contents == [None, None]
+
+
+# Test case for retrying a streamed local file upload after a server error
+def test_upload_and_extract_content_local_file_server_error_then_success(tmp_path):
+    """
+    Test case for reopening and resending a local file when the first upload gets a 5xx.
+    """
+    local_file_path = os.path.join(tmp_path, 'test_image.jpg')
+    cv2.imwrite(local_file_path, np.zeros((100, 100), dtype=np.uint8))  # Create a dummy image
+
+    with requests_mock.Mocker() as m, patch('opencv_with_users.time.sleep') as mock_sleep:
+        m.post('https://api.ocr.space/parse/image', [
+            {'status_code': 503, 'text': 'Service Unavailable'},
+            {'json': {'ParsedResults': [{'ParsedText': 'Test content'}]}},
+        ])
+
+        extracted_content = upload_and_extract_content(local_file_path=local_file_path, api_key=TEST_OCR_API_KEY)
+        assert extracted_content == 'Test content'
+        assert m.call_count == 2
+        assert mock_sleep.call_count == 1
+
+
+# Test case for upload_and_extract_content with in-memory image bytes
+def test_upload_and_extract_content_with_file_bytes():
+    """
+    Test case for uploading and extracting content from an image encoded in memory using MOCK.
+    """
+    _, buffer = cv2.imencode('.jpg', np.zeros((100, 100), dtype=np.uint8))  # Create a dummy image
+
+    with requests_mock.Mocker() as m:
+        mock_response = {'ParsedResults': [{'ParsedText': 'Test content'}]}
+        m.post('https://api.ocr.space/parse/image', json=mock_response)
+
+        extracted_content = upload_and_extract_content(file_bytes=buffer.tobytes(), api_key=TEST_OCR_API_KEY)
+        assert extracted_content == 'Test content'
+        assert b'capture.jpg' in m.last_request.body
+
+
+# Test case for batch_extract with several local files
+def test_batch_extract(tmp_path):
+    """
+    Test case for extracting content from several local files in parallel using MOCK.
+    """
+    local_file_paths = []
+    for index in range(3):
+        local_file_path = os.path.join(tmp_path, f'test_image_{index}.jpg')
+        cv2.imwrite(local_file_path, np.zeros((100, 100), dtype=np.uint8))  # Create a dummy image
+        local_file_paths.append(local_file_path)
+
+    with requests_mock.Mocker() as m:
+        mock_response = {'ParsedResults': [{'ParsedText': 'Test content'}]}
+        m.post('https://api.ocr.space/parse/image', json=mock_response)
+
+        extracted_contents = batch_extract(local_file_paths, api_key=TEST_OCR_API_KEY, max_workers=2)
+        assert extracted_contents == ['Test content'] * 3
+        assert m.call_count == 3
+
+
+# Test case for batch_extract with a missing file among valid ones
+def test_batch_extract_missing_file(tmp_path):
+    """
+    Test case for batch_extract returning None for an unreadable file without aborting the batch.
+    """
+    local_file_path = os.path.join(tmp_path, 'test_image.jpg')
+    cv2.imwrite(local_file_path, np.zeros((100, 100), dtype=np.uint8))  # Create a dummy image
+    local_file_paths = [local_file_path, os.path.join(tmp_path, 'missing_image.jpg'), local_file_path]
+
+    with requests_mock.Mocker() as m:
+        mock_response = {'ParsedResults': [{'ParsedText': 'Test content'}]}
+        m.post('https://api.ocr.space/parse/image', json=mock_response)
+
+        extracted_contents = batch_extract(local_file_paths, api_key=TEST_OCR_API_KEY, max_workers=2)
+        assert extracted_contents == ['Test content', None, 'Test content']
+        assert m.call_count == 2
+
+
 # Test case for upload_and_extract_content with API error
 def test_upload_and_extract_content_api_error(requests_mock):
     """
@@ -116,6 +269,45 @@ def test_upload_and_extract_content_invalid_response(requests_mock):
     assert extracted_content is None
 
 
+# Test case for identifying words and integers in extracted content
+def test_extract_words_and_integers():
+    """
+    Test case for splitting extracted content into words and integers.
+    """
+    words, integers = extract_words_and_integers("Time is\r\n10 AM\r\n10,20 abc123")
+    assert words == ['Time', 'is', 'AM']
+    assert integers == ['10', '10', '20']
+
+
+# Test case for the str-method tokenizer matching the regex tokenizer
+@pytest.mark.parametrize("text", [
+    "Time is\r\n10 AM\r\n",
+    "10,20 abc123 x_1 under_score 42-7",
+    "Caf\u00e9 9 \u00e9t\u00e9 10",  # non-ASCII falls back to the regex path
+    "",
+])
+def test_fast_tokenize_matches_regex(text):
+    """
+    Test case for fast_tokenize giving the same words and integers as extract_words_and_integers.
+    """
+    assert fast_tokenize(text) == extract_words_and_integers(text)
+
+
+# Test case for preparing a captured image for OCR upload
+def test_prep_for_ocr():
+    """
+    Test case for downscaling and JPEG-encoding an image before OCR upload.
+    """
+    image_bytes = _prep_for_ocr(np.zeros((2000, 3200, 3), dtype=np.uint8))
+    decoded = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape[:2] == (1000, 1600)
+
+    # Images already within the limit keep their size
+    image_bytes = _prep_for_ocr(np.zeros((100, 100, 3), dtype=np.uint8))
+    decoded = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape[:2] == (100, 100)
+
+
 # Test case for capture_image
 def test_capture_image():
     """
@@ -125,6 +317,32 @@ def test_capture_image():
     assert captured_image is not None
 
 
+# Test case for capturing several images with one open camera
+def test_camera_multiple_captures():
+    """
+    Test case for capturing several images while the camera device stays open.
+    """
+    with Camera() as camera:
+        frames = [camera.capture() for _ in range(3)]
+    assert all(frame is not None for frame in frames)
+
+
+# Test case for falling back to any backend when the preferred one cannot open the camera
+def test_camera_falls_back_to_any_backend():
+    """
+    Test case for reopening the camera with cv2.CAP_ANY when the preferred backend fails.
+    """
+    unavailable, available = MagicMock(), MagicMock()
+    unavailable.isOpened.return_value = False
+    available.isOpened.return_value = True
+    available.get.return_value = 1
+    with patch('opencv_with_users.cv2.VideoCapture', side_effect=[unavailable, available]) as video_capture:
+        with Camera(backend=cv2.CAP_V4L2) as camera:
+            assert camera.cap is available
+    assert video_capture.call_args_list[1].args == (0, cv2.CAP_ANY)
+    unavailable.release.assert_called_once()
+
+
 '''Test cases that uses actual OCR'''
 
 
@@ -169,7 +387,7 @@ def test_upload_and_extract_content_no_image():
     """
     Test case for handling upload_and_extract_content with no image provided.
     """
-    with pytest.raises(ValueError, match="Either image URL or local file path must be provided"):
+    with pytest.raises(ValueError, match="Either image URL, local file path or file bytes must be provided"):
         extracted_content = upload_and_extract_content(api_key=TEST_OCR_API_KEY)
     # assert extracted_content is None
 
@@ -185,11 +403,83 @@ def test_upload_and_extract_content_unexpected_status_code(requests_mock):
     assert extracted_content is None
 
 
+# Test case for upload_and_extract_content retrying after a rate limit error
+def test_upload_and_extract_content_rate_limited_then_success(requests_mock):
+    """
+    Test case for retrying upload_and_extract_content when OCR.space reports a rate limit.
+    """
+    image_url = 'https://example.com/sample_image.jpg'
+    requests_mock.post('https://api.ocr.space/parse/image', [
+        {'json': {'IsErroredOnProcessing': True, 'ErrorMessage': ['You may only perform this action upto maximum 180 number of times within 3600 seconds. Rate limit exceeded.']}},
+        {'json': {'ParsedResults': [{'ParsedText': 'Test content'}]}},
+    ])
+    with patch('opencv_with_users.time.sleep') as mock_sleep:
+        extracted_content = upload_and_extract_content(image_url=image_url, api_key=TEST_OCR_API_KEY)
+    assert extracted_content == 'Test content'
+    assert mock_sleep.call_count == 1
+    assert requests_mock.call_count == 2
+
+
+# Test case for upload_and_extract_content giving up after repeated quota errors
+def test_upload_and_extract_content_quota_exhausted(requests_mock):
+    """
+    Test case for handling upload_and_extract_content when every attempt is rejected for quota.
+    """
+    image_url = 'https://example.com/sample_image.jpg'
+    mock_response = {'IsErroredOnProcessing': True, 'ErrorMessage': 'Daily quota exceeded'}
+    requests_mock.post('https://api.ocr.space/parse/image', json=mock_response)
+    with patch('opencv_with_users.time.sleep'):
+        extracted_content = upload_and_extract_content(image_url=image_url, api_key=TEST_OCR_API_KEY)
+    assert extracted_content is None
+    assert requests_mock.call_count == 3
+
+
+# Test case for upload_and_extract_content retrying an HTTP 429 a bounded number of times
+def test_upload_and_extract_content_http_429(requests_mock):
+    """
+    Test case for handling upload_and_extract_content when every attempt returns HTTP 429.
+    """
+    image_url = 'https://example.com/sample_image.jpg'
+    requests_mock.post('https://api.ocr.space/parse/image', status_code=429, text='Too Many Requests')
+    with patch('opencv_with_users.time.sleep') as mock_sleep:
+        extracted_content = upload_and_extract_content(image_url=image_url, api_key=TEST_OCR_API_KEY)
+    assert extracted_content is None
+    assert requests_mock.call_count == 3
+    assert mock_sleep.call_count == 2
+
+
+# Test case for spacing consecutive OCR requests with the token bucket
+def test_token_bucket_spaces_calls():
+    """
+    Test case for the rate limiter enforcing the minimum interval between calls.
+    """
+    bucket = TokenBucket(rps=4)
+    with patch('opencv_with_users.time.sleep') as mock_sleep:
+        bucket.acquire()
+        mock_sleep.assert_not_called()
+        bucket.acquire()
+        assert mock_sleep.call_count == 1
+        assert 0 < mock_sleep.call_args[0][0] <= 0.25
+
+
+# Test case for disabling the token bucket with a non-positive rate
+@pytest.mark.parametrize("rps", [0, -1])
+def test_token_bucket_unlimited(rps):
+    """
+    Test case for the rate limiter never waiting when the rate is 0 or less.
+    """
+    bucket = TokenBucket(rps=rps)
+    with patch('opencv_with_users.time.sleep') as mock_sleep:
+        for _ in range(3):
+            bucket.acquire()
+        mock_sleep.assert_not_called()
+
+
 '''Test Cases using Actual Database'''
 
 
 # Test case to create a new user and verify it in the database
-def test_create_user_and_verify_in_database():
+def test_create_user_and_verify_in_database(user_collection):
     """
     Test case for creating a new user and verifying it in the database.
     """
@@ -206,11 +496,12 @@ def test_create_user_and_verify_in_database():
     # Verify that the user now exists in the database
     created_user = user_collection.find_one({"username": new_username})
     assert created_user is not None
-    assert created_user["password"] == new_password
+    assert "password" not in created_user
+    assert password_hasher.verify(created_user["pwhash"], new_password)
 
 
 # Test case to create a new user and attempt to create a duplicate
-def test_create_user_duplicate(setup_database):
+def test_create_user_duplicate(setup_database, user_collection):
     existing_username = "existing_user_db"
     existing_password = "existing_password_db"
 
@@ -227,7 +518,7 @@ def test_create_user_duplicate(setup_database):
 
 
 # Test case for ocr response verification and adding content to the database
-def test_valid_ocr_response_and_add_to_db():
+def test_valid_ocr_response_and_add_to_db(user_collection):
     """
     Test case for verifying a valid OCR response and adding the content to the database.
     """
@@ -257,12 +548,12 @@ def test_valid_ocr_response_and_add_to_db():
     # Verify that the user and the extracted content now exist in the database
     user_with_content = user_collection.find_one({"username": username})
     assert user_with_content is not None
-    assert user_with_content["password"] == password
+    assert password_hasher.verify(user_with_content["pwhash"], password)
     assert user_with_content["extracted_content"] == extracted_content
 
 
 # Test case for updating extracted content in the database as an array of objects
-def test_update_extracted_content_to_db():
+def test_update_extracted_content_to_db(test_user_collection, user_collection):
     """
     Test case for updating extracted content in the database as an array of objects.
     """
@@ -307,6 +598,32 @@ def test_update_extracted_content_to_db():
     print(extracted_array_content)
 
 
+# Test case for batching extracted content updates with bulk_write
+def test_flush_extracted_content_to_db(setup_database, user_collection):
+    """
+    Test case for queueing extracted content updates and flushing them in one bulk write.
+    """
+    username = "test_user_bulk_content"
+    password = "test_password_bulk_content"
+    create_user(username, password)
+
+    pending_ops = []
+    extracted_array_content = [{"text": "10,20"}, {"text": "Time is 10 AM"}]
+    for content in extracted_array_content:
+        queue_extracted_content(pending_ops, username, content)
+    assert len(pending_ops) == 2
+
+    result = flush(pending_ops)
+    assert result.modified_count == 2
+    assert pending_ops == []
+
+    updated_user_data = user_collection.find_one({"username": username})
+    assert updated_user_data["extracted_content"] == extracted_array_content
+
+    # Flushing an empty queue is a no-op
+    assert flush(pending_ops) is None
+
+
 # Test case for login with correct credentials
 def test_login_correct_credentials():
     username = "test_login_user"
@@ -320,6 +637,25 @@ def test_login_correct_credentials():
     assert logged_in_user == username
 
 
+# Test case for login migrating a legacy plaintext password to a hash
+def test_login_migrates_plaintext_password(setup_database, user_collection):
+    username = "test_legacy_login_user"
+    password = "test_legacy_login_password"
+
+    # Accounts created before hashing store the plaintext password
+    user_collection.insert_one({"username": username, "password": password})
+
+    logged_in_user = login(username, password)
+    assert logged_in_user == username
+
+    migrated_user = user_collection.find_one({"username": username})
+    assert "password" not in migrated_user
+    assert password_hasher.verify(migrated_user["pwhash"], password)
+
+    # The migrated account still logs in
+    assert login(username, password) == username
+
+
 # Test case for login with incorrect password
 # def test_login_incorrect_password():
 #     username = "test_incorrect_password_user"
@@ -342,10 +678,5 @@ def test_login_correct_credentials():
 #         login(username, "password")
 
 
-# Ensure to close the MongoDB client after running the tests
-def teardown():
-    client.close()
-
-
 if __name__ == '__main__':
     pytest.main()